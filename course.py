@@ -1,21 +1,26 @@
+import random
+
 import numpy as np
-from random import choice
 from operator import add
 from operator import sub
 
 
-def generate_course(grid_size) -> np.array:
+def generate_course(grid_size, seed=None) -> np.array:
     """This function generates a course which is essentially a random walk around a grid space starting and ending in
-    the same space it returns a grid with the layout of the course encoded into it"""
+    the same space it returns a grid with the layout of the course encoded into it. The same seed always gives the
+    same course, without touching the global random state"""
+
+    rng = random.Random(seed)
 
     start = (int(grid_size / 2), 0)
     next = (int(grid_size / 2) + 1, 0)
     end = (int(grid_size / 2) - 1, 0)
 
     course = [start, next]
+    visited = set(course)
     current = next
     steps = [[1, 0], [-1, 0], [0, 1], [0, -1]]
-    dead_ends = []
+    dead_ends = set()
 
     # Run a random walk through the course space
     while current != end:
@@ -23,7 +28,7 @@ def generate_course(grid_size) -> np.array:
 
         for step in steps:
             next = tuple(map(add, current, step))
-            if next in course or next in dead_ends:
+            if next in visited or next in dead_ends:
                 continue
             if -1 in next or grid_size in next:
                 continue
@@ -31,11 +36,14 @@ def generate_course(grid_size) -> np.array:
 
         if not available_steps:
             # hit a dead end
-            dead_ends.append(course.pop())
+            dead_end = course.pop()
+            visited.discard(dead_end)
+            dead_ends.add(dead_end)
             current = course[-1]
         else:
-            current = choice(available_steps)
+            current = rng.choice(available_steps)
             course.append(current)
+            visited.add(current)
 
     # encode the course into a grid that can be interpreted as unique pieces
     grid = np.zeros((grid_size, grid_size))
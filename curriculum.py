@@ -0,0 +1,161 @@
+"""Curriculum of courses ordered by difficulty.
+
+Every course in a bank of seeded courses is scored from its path and piece
+codes. The corner and path counts are cached on disk by (grid size, seed)
+since a seed always generates the same course, and the difficulty is worked
+out from them on load. The scheduler serves the easiest course
+first and moves on to harder ones as the population learns to lap them, and
+ends the run once the hardest course has been lapped.
+
+"""
+
+import json
+import math
+import os
+
+from neat.reporting import BaseReporter
+
+from vector_racing import Course, GRID_SIZE
+
+CORNER_PIECES = (3, 6, 9, 12)
+CONSECUTIVE_CORNER_WEIGHT = 2
+CACHE_FILENAME = 'course_difficulty.json'
+# Bump whenever course generation or the cached counts change, so stale entries are recounted
+CACHE_VERSION = 1
+PROMOTION_FRACTION = 1.0
+
+
+def course_counts(course):
+    """Return the corner and path counts of a course, counted from the piece codes along its path."""
+    corners = [course.course_grid[step] in CORNER_PIECES for step in course.path]
+
+    return {
+        'turns': int(sum(corners)),
+        'consecutive_corners': int(sum(corners[i - 1] and corners[i] for i in range(len(corners)))),
+        'path_length': len(course.path),
+    }
+
+
+def with_difficulty(counts):
+    """Return the counts of a course together with its difficulty.
+
+    A corner straight after another corner leaves no straight to recover in, so those pairs are weighted more
+    heavily. The difficulty is the weighted corner count per path piece.
+
+    """
+
+    weighted_corners = counts['turns'] + CONSECUTIVE_CORNER_WEIGHT * counts['consecutive_corners']
+    return dict(counts, difficulty=weighted_corners / counts['path_length'])
+
+
+def course_difficulty(course):
+    """Return the difficulty metrics of a course."""
+    return with_difficulty(course_counts(course))
+
+
+class CourseBank:
+
+    def __init__(self, seeds, grid_size=GRID_SIZE, cache_filename=CACHE_FILENAME):
+        """Initialise a bank of seeded courses and their cached difficulty metrics.
+
+        Args:
+            seeds (iterable): The seeds of the courses in the bank.
+            grid_size (int): The grid size of every course in the bank.
+            cache_filename (str): The json file course counts are cached in, None disables the cache.
+
+        """
+
+        self.grid_size = grid_size
+        self.cache_filename = cache_filename
+        self.courses = {}
+        self.counts = self._load_cache()
+
+        missing = [seed for seed in seeds if self._key(seed) not in self.counts]
+        for seed in missing:
+            self.counts[self._key(seed)] = course_counts(self.course(seed))
+        if missing:
+            self._save_cache()
+
+        # Only the counts are cached, so a change to the difficulty weighting takes effect straight away
+        self.metrics = {self._key(seed): with_difficulty(self.counts[self._key(seed)]) for seed in seeds}
+
+        # Easiest first, ties broken by seed so the order is reproducible
+        self.seeds = sorted(seeds, key=lambda seed: (self.metrics[self._key(seed)]['difficulty'], seed))
+
+    def _key(self, seed):
+        return 'v{}:{}:{}'.format(CACHE_VERSION, self.grid_size, seed)
+
+    def _load_cache(self):
+        if self.cache_filename is None or not os.path.exists(self.cache_filename):
+            return {}
+        with open(self.cache_filename) as file:
+            counts = json.load(file)
+        # Drop entries written by other cache versions rather than carrying them forward
+        prefix = 'v{}:'.format(CACHE_VERSION)
+        return {key: value for key, value in counts.items() if key.startswith(prefix)}
+
+    def _save_cache(self):
+        if self.cache_filename is None:
+            return
+        with open(self.cache_filename, 'w') as file:
+            json.dump(self.counts, file, indent=1, sort_keys=True)
+
+    def __len__(self):
+        return len(self.seeds)
+
+    def course(self, seed):
+        """Return the course for a seed, generating it on first use."""
+        if seed not in self.courses:
+            self.courses[seed] = Course(self.grid_size, seed)
+        return self.courses[seed]
+
+    def difficulty(self, seed):
+        return self.metrics[self._key(seed)]
+
+
+class CurriculumScheduler(BaseReporter):
+
+    def __init__(self, bank, promotion_fraction=PROMOTION_FRACTION):
+        """Initialise a curriculum starting from the easiest course in the bank.
+
+        Args:
+            bank (CourseBank): The courses to serve, in increasing difficulty.
+            promotion_fraction (float): The fraction of a lap the best genome must drive before moving on.
+
+        Genomes must carry their raw checkpoint count, before any novelty bonus, in a ``checkpoints`` attribute.
+        The scheduler owns the run's ``fitness_threshold``, so NEAT only stops once the last course is lapped.
+
+        """
+
+        self.bank = bank
+        self.promotion_fraction = promotion_fraction
+        self.level = 0
+        self.complete = False
+        # The genome that lapped the hardest course, set once the curriculum is complete
+        self.champion = None
+
+    def current_seed(self):
+        return self.bank.seeds[self.level]
+
+    def current_course(self):
+        return self.bank.course(self.current_seed())
+
+    def post_evaluate(self, config, population, species, best_genome):
+        """Move on to the next course once the population can lap the current one."""
+        course = self.current_course()
+        target = min(self.promotion_fraction * len(course.path), course.max_score())
+        leader = max(population.values(), key=lambda genome: genome.checkpoints)
+        lapped = leader.checkpoints >= target
+
+        if lapped and self.level + 1 < len(self.bank):
+            self.level += 1
+            print('Curriculum moving to level {} of {}, course seed {} with difficulty {:.3f}'.format(
+                self.level, len(self.bank), self.current_seed(),
+                self.bank.difficulty(self.current_seed())['difficulty']))
+        elif lapped:
+            self.complete = True
+            self.champion = leader
+            print('Curriculum complete, the hardest course has been lapped')
+
+        # NEAT checks the threshold straight after post_evaluate, any fitness meets -inf and none meets inf
+        config.fitness_threshold = -math.inf if self.complete else math.inf
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""Distributed genome evaluation over TCP.
+
+A coordinator compiles each genome into a network and hands batches of
+(job id, genome id, course id, network) jobs to worker daemons connected over sockets.
+Every worker keeps a second batch queued while it drives the current one, and
+any batch held by a worker that drops out or goes silent is handed to the
+remaining workers. Workers reply in JSON, so the coordinator never unpickles
+anything a connecting peer sends it.
+
+Start the workers on each machine (or several on localhost):
+
+    python distributed.py worker --host 127.0.0.1 --port 5555
+
+then pass ``DistributedEvaluator(...).evaluate`` to ``Population.run``.
+
+"""
+
+import argparse
+import json
+import pickle
+import queue
+import socket
+import struct
+import threading
+from collections import deque
+
+HEADER = struct.Struct('!I')
+DEFAULT_ADDRESS = ('127.0.0.1', 5555)
+BATCH_SIZE = 10
+PIPELINE_DEPTH = 2
+# Seconds a single episode may take before a silent worker is treated as lost
+JOB_TIMEOUT = 120
+# Times a batch is handed out before its jobs are reported as failed
+MAX_BATCH_ATTEMPTS = 3
+MAX_REPLY_SIZE = 1 << 20
+
+
+def send_message(sock, message):
+    """Pickle a coordinator to worker message and send it with a length prefix."""
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('Connection closed by peer')
+        data.extend(chunk)
+    return bytes(data)
+
+
+def recv_message(sock):
+    """Receive a single length prefixed message sent by send_message.
+
+    Unpickling runs code chosen by the sender, so only workers call this, on messages from their coordinator.
+
+    """
+    size, = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    return pickle.loads(_recv_exactly(sock, size))
+
+
+def send_reply(sock, results):
+    """Send a worker's per-job results as length prefixed JSON."""
+    payload = json.dumps(results).encode()
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def recv_reply(sock, jobs):
+    """Receive and validate a worker's results for a batch of jobs.
+
+    Each result is either {'fitness': number, 'behaviour': [numbers], 'checksum': int} or {'error': message},
+    anything else raises a ValueError.
+
+    """
+    size, = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    if size > MAX_REPLY_SIZE:
+        raise ValueError('Reply of {} bytes is too large'.format(size))
+
+    results = json.loads(_recv_exactly(sock, size))
+    if not isinstance(results, list) or len(results) != jobs:
+        raise ValueError('Expected a list of {} results'.format(jobs))
+    for result in results:
+        if not isinstance(result, dict):
+            raise ValueError('Malformed result {!r}'.format(result))
+        if 'error' in result:
+            if not isinstance(result['error'], str):
+                raise ValueError('Malformed result {!r}'.format(result))
+        elif not (_is_number(result.get('fitness')) and isinstance(result.get('behaviour'), list)
+                  and all(_is_number(value) for value in result['behaviour'])
+                  and isinstance(result.get('checksum'), int) and not isinstance(result['checksum'], bool)):
+            raise ValueError('Malformed result {!r}'.format(result))
+    return results
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class DistributedEvaluator:
+
+    def __init__(self, courses, address=DEFAULT_ADDRESS, batch_size=BATCH_SIZE, pipeline_depth=PIPELINE_DEPTH,
+                 job_timeout=JOB_TIMEOUT):
+        """Initialise the coordinator and start accepting workers.
+
+        Args:
+            courses (list): The courses every genome is driven on, a course id is its index in this list.
+            address (tuple): The (host, port) to listen on for workers.
+            batch_size (int): The number of jobs sent to a worker in one message.
+            pipeline_depth (int): The number of batches a worker may hold at once.
+            job_timeout (float): The seconds a worker may take per job before it is treated as lost.
+
+        """
+
+        self.courses = courses
+        self.courses_version = 0
+        self.batch_size = batch_size
+        self.pipeline_depth = pipeline_depth
+        self.job_timeout = job_timeout
+        # Each pending entry is an (attempts, jobs) pair
+        self.pending = deque()
+        self.results = {}
+        self.failures = {}
+        # Each genome's behaviours on every course of the last generation, concatenated in course order
+        self.behaviours = {}
+        # The (fitness, trajectory checksum) of every (genome id, course id) episode of the last generation
+        self.episodes = {}
+        self.outstanding = 0
+        self.workers = 0
+        self.condition = threading.Condition()
+        self.running = True
+
+        self.server = socket.create_server(address)
+        self.address = self.server.getsockname()
+        threading.Thread(target=self._accept_workers, daemon=True).start()
+
+    def _accept_workers(self):
+        while self.running:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            threading.Thread(target=self._serve_worker, args=(sock,), daemon=True).start()
+
+    def _serve_worker(self, sock):
+        """Feed one worker with batches until it disconnects, times out or the evaluator is closed."""
+        in_flight = deque()
+        sent_version = None
+        try:
+            with self.condition:
+                self.workers += 1
+                self.condition.notify_all()
+
+            while self.running:
+                with self.condition:
+                    while self.running and not in_flight and not self.pending:
+                        self.condition.wait()
+                    # Keep the worker busy with a queued batch while it runs the current one
+                    to_send = []
+                    if self.pending and sent_version != self.courses_version:
+                        # Batches are queued behind the course update, so a worker never mixes course banks
+                        sent_version = self.courses_version
+                        to_send.append(('courses', self.courses))
+                    while self.pending and len(in_flight) < self.pipeline_depth:
+                        attempts, batch = self.pending.popleft()
+                        in_flight.append((attempts + 1, batch))
+                        to_send.append(('batch', batch))
+                for message in to_send:
+                    send_message(sock, message)
+                if not in_flight:
+                    continue
+
+                # The first batch in flight starts as soon as the previous reply is sent, so a worker that stays
+                # silent for longer than the whole batch should take has died or been cut off
+                sock.settimeout(self.job_timeout * len(in_flight[0][1]))
+                results = recv_reply(sock, len(in_flight[0][1]))
+                with self.condition:
+                    _, batch = in_flight.popleft()
+                    for (job_id, genome_id, course_id, _), result in zip(batch, results):
+                        if 'error' in result:
+                            self.failures[job_id] = (genome_id, result['error'])
+                        else:
+                            self.results[job_id] = (genome_id, course_id, result)
+                    self.outstanding -= 1
+                    self.condition.notify_all()
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self.condition:
+                # Hand any unfinished work to the remaining workers, unless it has already cost several of them
+                for attempts, batch in reversed(in_flight):
+                    if attempts < MAX_BATCH_ATTEMPTS:
+                        self.pending.appendleft((attempts, batch))
+                        continue
+                    for job_id, genome_id, _, _ in batch:
+                        self.failures[job_id] = (genome_id, 'batch lost with {} workers'.format(attempts))
+                    self.outstanding -= 1
+                self.workers -= 1
+                self.condition.notify_all()
+            sock.close()
+
+    def set_courses(self, courses):
+        """Replace the course bank, workers receive it before their next batch."""
+        with self.condition:
+            if courses != self.courses:
+                self.courses = courses
+                self.courses_version += 1
+
+    def evaluate(self, genomes, config):
+        """Evaluate a generation on the connected workers, compatible with Population.run."""
+        import neat
+
+        jobs = []
+        for genome_id, genome in genomes:
+            net = neat.nn.FeedForwardNetwork.create(genome, config)
+            for course_id in range(len(self.courses)):
+                jobs.append((len(jobs), genome_id, course_id, net))
+
+        with self.condition:
+            self.results = {}
+            self.failures = {}
+            for i in range(0, len(jobs), self.batch_size):
+                self.pending.append((0, jobs[i:i + self.batch_size]))
+            self.outstanding = len(self.pending)
+            self.condition.notify_all()
+
+            while self.outstanding:
+                if not self.workers:
+                    print('Waiting for workers to connect on {}:{}'.format(*self.address))
+                self.condition.wait(timeout=5)
+
+            if self.failures:
+                genome_id, error = next(iter(self.failures.values()))
+                raise RuntimeError('{} of {} jobs failed, e.g. genome {}: {}'.format(
+                    len(self.failures), len(jobs), genome_id, error))
+
+            scores = {}
+            self.behaviours = {}
+            self.episodes = {}
+            # Job ids follow course order within each genome
+            for job_id in sorted(self.results):
+                genome_id, course_id, result = self.results[job_id]
+                scores.setdefault(genome_id, []).append(result['fitness'])
+                self.behaviours.setdefault(genome_id, []).extend(result['behaviour'])
+                self.episodes[genome_id, course_id] = (result['fitness'], result['checksum'])
+
+        for genome_id, genome in genomes:
+            genome.fitness = sum(scores[genome_id]) / len(scores[genome_id])
+
+    def close(self):
+        """Stop accepting workers and release idle worker connections."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.server.close()
+
+
+def run_worker(address=DEFAULT_ADDRESS):
+    """Connect to a coordinator and drive cars for it until the connection closes."""
+    from vector_racing import indefinite_game_loop as drive_car
+    from vector_racing import Car
+
+    sock = socket.create_connection(address)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    courses = []
+    messages = queue.Queue()
+
+    def receive_messages():
+        # Receive the next batch while the main thread is still driving the current one
+        try:
+            while True:
+                messages.put(recv_message(sock))
+        except (OSError, EOFError):
+            pass
+        except Exception as error:
+            # e.g. a course or network pickled by a different version of the code
+            print('Worker could not read a message from {}:{}, {}: {}'.format(
+                *address[:2], type(error).__name__, error))
+        finally:
+            # Always wake the main loop, otherwise it waits on the queue forever
+            messages.put(None)
+
+    threading.Thread(target=receive_messages, daemon=True).start()
+
+    while (message := messages.get()) is not None:
+        kind, payload = message
+        if kind == 'courses':
+            courses = payload
+            continue
+
+        results = []
+        for _, _, course_id, net in payload:
+            # Report a failing job rather than dying on it, which would only pass it on to the next worker
+            try:
+                course = courses[course_id]
+                car = Car(*course.start_position(), brain=net)
+                fitness, behaviour = drive_car(car, course, return_behaviour=True)
+                results.append({'fitness': fitness, 'behaviour': behaviour.tolist(),
+                                'checksum': car.trajectory_checksum})
+            except Exception as error:
+                results.append({'error': '{}: {}'.format(type(error).__name__, error)})
+        send_reply(sock, results)
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('role', choices=['worker'])
+    parser.add_argument('--host', default=DEFAULT_ADDRESS[0])
+    parser.add_argument('--port', type=int, default=DEFAULT_ADDRESS[1])
+    args = parser.parse_args()
+
+    run_worker((args.host, args.port))
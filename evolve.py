@@ -4,41 +4,107 @@
 
 from __future__ import print_function
 import neat
-from vector_racing import indefinite_game_loop as drive_car
-from vector_racing import Car
+from distributed import DistributedEvaluator
+from novelty import NoveltyArchive
 import pickle
 import visualize
 
+# Set to a (host, port) to evaluate genomes on distributed.py worker daemons
+EVALUATOR_ADDRESS = None
+
+# Weight of the behaviour novelty score added to the laps driven, 0 disables novelty search
+NOVELTY_WEIGHT = 0.0
+
+# Genomes are scored on seeded courses served from easiest to hardest as the population improves
+CURRICULUM_SEEDS = range(50)
+
 def eval_genomes(genomes, config):
+    behaviours = []
+    course = curriculum.current_course()
     for genome_id, genome in genomes:
 
         net = neat.nn.FeedForwardNetwork.create(genome, config)
-        ai_car = Car(brain=net)
-        genome.fitness = drive_car(ai_car)
+        ai_car = Car(*course.start_position(), brain=net)
+        if NOVELTY_WEIGHT:
+            genome.fitness, behaviour = drive_car(ai_car, course, return_behaviour=True)
+            behaviours.append(behaviour)
+        else:
+            genome.fitness = drive_car(ai_car, course)
+
+    score_generation(genomes, behaviours, course)
+
+
+def score_generation(genomes, behaviours, course):
+    # The curriculum promotes on the raw checkpoint count, not the novelty bonus. Fitness counts laps instead, so
+    # that it stays comparable for the reporters and stagnation as the curriculum moves between courses.
+    for genome_id, genome in genomes:
+        genome.checkpoints = genome.fitness
+        genome.fitness = genome.checkpoints / len(course.path)
+
+    if NOVELTY_WEIGHT:
+        novelty = novelty_archive.score_generation(behaviours)
+        for (genome_id, genome), score in zip(genomes, novelty):
+            genome.fitness += NOVELTY_WEIGHT * score
+
+
+# The plot process is spawned and imports this module, so everything with side effects waits for __main__: importing
+# vector_racing opens the game window and the course bank reads and writes its difficulty cache.
+if __name__ == "__main__":
+    from vector_racing import indefinite_game_loop as drive_car
+    from vector_racing import Car
+    from curriculum import CourseBank, CurriculumScheduler
+
+    novelty_archive = NoveltyArchive()
+    curriculum = CurriculumScheduler(CourseBank(CURRICULUM_SEEDS))
+
+    # Load configuration.
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                         neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                         'config-feedforward')
+
+    # Create the population, which is the top-level object for a NEAT run.
+    p = neat.Population(config)
+
+    # Add a stdout reporter to show progress in the terminal.
+    p.add_reporter(neat.StdOutReporter(False))
+
+    # Record per-generation stats to disk and redraw the champion whenever its structure changes.
+    stats_reporter = visualize.StatsStoreReporter(visualize.StatsStore('stats', clear=True), net_filename='champion')
+    p.add_reporter(stats_reporter)
+
+    # Move on to harder courses once the current one can be lapped, the curriculum also decides when the run is over
+    # in place of the config's fitness_threshold.
+    p.add_reporter(curriculum)
 
+    # Run until a solution is found.
+    if EVALUATOR_ADDRESS:
+        evaluator = DistributedEvaluator([curriculum.current_course()], EVALUATOR_ADDRESS)
 
-# Load configuration.
-config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
-                     neat.DefaultSpeciesSet, neat.DefaultStagnation,
-                     'config-feedforward')
+        def eval_genomes_distributed(genomes, config):
+            course = curriculum.current_course()
+            evaluator.set_courses([course])
+            evaluator.evaluate(genomes, config)
+            score_generation(genomes, [evaluator.behaviours[genome_id] for genome_id, genome in genomes], course)
 
-# Create the population, which is the top-level object for a NEAT run.
-p = neat.Population(config)
+        p.run(eval_genomes_distributed)
+        evaluator.close()
+    else:
+        p.run(eval_genomes)
 
-# Add a stdout reporter to show progress in the terminal.
-p.add_reporter(neat.StdOutReporter(False))
+    # The run's best genome may have been scored on an easier course, keep the one that lapped the hardest.
+    winner = curriculum.champion
 
-# Run until a solution is found.
-winner = p.run(eval_genomes)
+    # Make sure the fitness plot includes the final generation.
+    stats_reporter.close()
 
-# Display the winning genome.
-print('\nBest genome:\n{!s}'.format(winner))
+    # Display the winning genome.
+    print('\nBest genome:\n{!s}'.format(winner))
 
-# Show output of the most fit genome against training data.
-print('\nOutput:')
-winner_net = neat.nn.FeedForwardNetwork.create(winner, config)
+    # Show output of the most fit genome against training data.
+    print('\nOutput:')
+    winner_net = neat.nn.FeedForwardNetwork.create(winner, config)
 
-with open("winning_net_04.txt", "wb") as file:
-    pickle.dump(winner, file)
+    with open("winning_net_04.txt", "wb") as file:
+        pickle.dump(winner, file)
 
-visualize.draw_net(config, winner, True)
\ No newline at end of file
+    visualize.draw_net(config, winner, True)
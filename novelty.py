@@ -0,0 +1,133 @@
+"""Novelty search over car behaviours.
+
+Behaviours come from ``indefinite_game_loop(..., return_behaviour=True)``. The
+archive is indexed by a KD-tree so that the k-nearest-neighbour novelty of a
+whole generation costs O(P log N) rather than O(P * N) as the archive grows.
+
+"""
+
+import heapq
+
+import numpy as np
+
+LEAF_SIZE = 32
+NOVELTY_NEIGHBOURS = 15
+ARCHIVE_THRESHOLD = 0.1
+
+
+class KDTree:
+
+    def __init__(self, points, leaf_size=LEAF_SIZE):
+        """Build a static KD-tree over an (n, d) array of points.
+
+        Args:
+            points (np.array): The points to index.
+            leaf_size (int): The largest number of points kept in a leaf.
+
+        """
+
+        self.points = np.asarray(points, dtype=np.float64)
+        self.leaf_size = leaf_size
+        self.index = np.arange(len(self.points))
+        # Each node is (start, end, split dimension, split value, left, right), leaves have a split dimension of -1
+        self.nodes = []
+        self.root = self._build(0, len(self.points)) if len(self.points) else None
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self, start, end):
+        node = len(self.nodes)
+        if end - start <= self.leaf_size:
+            self.nodes.append((start, end, -1, 0.0, -1, -1))
+            return node
+
+        # Split on the widest dimension at the median point
+        idx = self.index[start:end]
+        points = self.points[idx]
+        dim = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+        mid = (end - start) // 2
+        self.index[start:end] = idx[np.argpartition(points[:, dim], mid)]
+        split = self.points[self.index[start + mid], dim]
+
+        self.nodes.append(None)
+        left = self._build(start, start + mid)
+        right = self._build(start + mid, end)
+        self.nodes[node] = (start, end, dim, split, left, right)
+        return node
+
+    def query(self, point, k):
+        """Return the distances to the k nearest points, nearest first."""
+        if self.root is None or k <= 0:
+            return np.zeros(0)
+
+        heap = []
+        self._query(self.root, np.asarray(point, dtype=np.float64), k, heap)
+        return np.sqrt(sorted(-d for d in heap))
+
+    def _query(self, node, point, k, heap):
+        start, end, dim, split, left, right = self.nodes[node]
+
+        if dim < 0:
+            dists = ((self.points[self.index[start:end]] - point) ** 2).sum(axis=1)
+            for d in dists:
+                if len(heap) < k:
+                    heapq.heappush(heap, -d)
+                elif d < -heap[0]:
+                    heapq.heapreplace(heap, -d)
+            return
+
+        diff = point[dim] - split
+        near, far = (left, right) if diff < 0 else (right, left)
+        self._query(near, point, k, heap)
+        # Only visit the far side if it could hold something closer than the current k-th neighbour
+        if len(heap) < k or diff * diff < -heap[0]:
+            self._query(far, point, k, heap)
+
+
+class NoveltyArchive:
+
+    def __init__(self, k=NOVELTY_NEIGHBOURS, threshold=ARCHIVE_THRESHOLD):
+        """Initialise an empty archive of past behaviours.
+
+        Args:
+            k (int): The number of nearest neighbours averaged into a novelty score.
+            threshold (float): The novelty a behaviour needs to be added to the archive.
+
+        """
+
+        self.k = k
+        self.threshold = threshold
+        self.behaviours = []
+        self.tree = KDTree(np.zeros((0, 0)))
+
+    def __len__(self):
+        return len(self.behaviours)
+
+    def novelty(self, behaviours):
+        """Score each behaviour by its mean distance to its k nearest neighbours in the archive and generation."""
+        behaviours = np.asarray(behaviours, dtype=np.float64)
+        generation = KDTree(behaviours)
+        scores = np.zeros(len(behaviours))
+
+        for i, behaviour in enumerate(behaviours):
+            # The nearest point in the generation is the behaviour itself
+            dists = np.concatenate((generation.query(behaviour, self.k + 1)[1:], self.tree.query(behaviour, self.k)))
+            if len(dists):
+                scores[i] = np.sort(dists)[:self.k].mean()
+
+        return scores
+
+    def add(self, behaviours, scores):
+        """Archive the behaviours whose novelty reaches the threshold and re-index the archive."""
+        added = [b for b, score in zip(behaviours, scores) if score >= self.threshold]
+        if added:
+            self.behaviours.extend(np.asarray(b, dtype=np.float64) for b in added)
+            self.tree = KDTree(np.array(self.behaviours))
+        return len(added)
+
+    def score_generation(self, behaviours):
+        """Return the novelty of a generation's behaviours, then archive the most novel of them."""
+        scores = self.novelty(behaviours)
+        self.add(behaviours, scores)
+        return scores
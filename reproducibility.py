@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Cross-engine reproducibility harness.
+
+Drives a fixed matrix of genomes x seeded courses through the reference engine
+and each faster engine, then compares the fitness and trajectory checksum of
+every episode. Any difference means an optimisation changed the simulation.
+
+    python reproducibility.py example_net.txt --seeds 0 1 2 --grid-size 6
+
+"""
+
+import argparse
+import multiprocessing
+import os
+import pickle
+import sys
+
+# Episodes don't need a visible window
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import neat
+
+from distributed import DistributedEvaluator, run_worker
+from vector_racing import indefinite_game_loop as drive_car
+from vector_racing import Car, Course
+
+CONFIG_FILENAME = 'config-feedforward'
+DISTRIBUTED_WORKERS = 2
+
+
+def load_config(filename=CONFIG_FILENAME):
+    return neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                       neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                       filename)
+
+
+def run_episode(genome, config, grid_size, seed, spatial_index=True):
+    """Drive a genome around a seeded course and return its (fitness, trajectory checksum)."""
+    course = Course(grid_size, seed)
+    course.spatial_index = spatial_index
+    car = Car(*course.start_position(), brain=neat.nn.FeedForwardNetwork.create(genome, config))
+    fitness = drive_car(car, course)
+    return fitness, car.trajectory_checksum
+
+
+def _run_job(job):
+    genome, config, grid_size, seed = job
+    return run_episode(genome, config, grid_size, seed)
+
+
+def reference_engine(genomes, config, grid_size, seeds):
+    """Every wall checked every tick, one episode at a time."""
+    return {(name, seed): run_episode(genome, config, grid_size, seed, spatial_index=False)
+            for name, genome in genomes for seed in seeds}
+
+
+def indexed_engine(genomes, config, grid_size, seeds):
+    """Walls looked up through the course's grid cell index."""
+    return {(name, seed): run_episode(genome, config, grid_size, seed)
+            for name, genome in genomes for seed in seeds}
+
+
+def parallel_engine(genomes, config, grid_size, seeds, processes=None):
+    """Indexed episodes spread over a process pool.
+
+    Workers are spawned since forking an open pygame display can hang, and closed rather than terminated since
+    SDL catches SIGTERM.
+
+    """
+    keys = [(name, seed) for name, _ in genomes for seed in seeds]
+    jobs = [(genome, config, grid_size, seed) for _, genome in genomes for seed in seeds]
+    pool = multiprocessing.get_context('spawn').Pool(processes)
+    try:
+        return dict(zip(keys, pool.map(_run_job, jobs)))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def distributed_engine(genomes, config, grid_size, seeds, workers=DISTRIBUTED_WORKERS):
+    """Episodes driven by localhost distributed.py workers, with courses and networks pickled over sockets."""
+    evaluator = DistributedEvaluator([Course(grid_size, seed) for seed in seeds], ('127.0.0.1', 0))
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=run_worker, args=(evaluator.address,)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    try:
+        evaluator.evaluate([(i, genome) for i, (_, genome) in enumerate(genomes)], config)
+    finally:
+        # Closing the evaluator hangs up on the workers, which then exit on their own
+        evaluator.close()
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+
+    return {(name, seed): evaluator.episodes[i, course_id]
+            for i, (name, _) in enumerate(genomes) for course_id, seed in enumerate(seeds)}
+
+
+ENGINES = {
+    'indexed': indexed_engine,
+    'parallel': parallel_engine,
+    'distributed': distributed_engine,
+}
+
+
+def compare(reference, candidate):
+    """Return the (genome, seed) keys whose fitness or checksum differ from the reference."""
+    return sorted(key for key in reference if candidate.get(key) != reference[key])
+
+
+def run_matrix(genomes, config, grid_size, seeds, engines=ENGINES):
+    """Run every engine over the matrix and return {engine name: mismatched keys}."""
+    reference = reference_engine(genomes, config, grid_size, seeds)
+    for (name, seed), (fitness, checksum) in sorted(reference.items()):
+        print('{} seed {}: fitness {} checksum {:08x}'.format(name, seed, fitness, checksum))
+
+    mismatches = {}
+    for engine_name, engine in engines.items():
+        mismatches[engine_name] = compare(reference, engine(genomes, config, grid_size, seeds))
+        print('{}: {}'.format(engine_name, 'identical' if not mismatches[engine_name]
+                              else '{} mismatched episodes {}'.format(len(mismatches[engine_name]),
+                                                                      mismatches[engine_name])))
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('genomes', nargs='+', help='pickled genome files, e.g. example_net.txt')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--grid-size', type=int, default=6)
+    parser.add_argument('--config', default=CONFIG_FILENAME)
+    args = parser.parse_args()
+
+    genomes = []
+    for filename in args.genomes:
+        with open(filename, 'rb') as file:
+            genomes.append((filename, pickle.load(file)))
+
+    mismatches = run_matrix(genomes, load_config(args.config), args.grid_size, args.seeds)
+    sys.exit(1 if any(mismatches.values()) else 0)
@@ -0,0 +1,59 @@
+"""Checks the KD-tree and novelty archive against brute force numpy.
+
+    python -m pytest tests
+
+"""
+
+import numpy as np
+import pytest
+
+from novelty import KDTree, NoveltyArchive
+
+
+def brute_force(points, point, k):
+    return np.sort(np.sqrt(((points - point) ** 2).sum(axis=1)))[:k]
+
+
+@pytest.mark.parametrize('n, d, leaf_size', [(1, 2, 32), (31, 2, 32), (200, 3, 4), (500, 16, 8)])
+def test_query_matches_brute_force(n, d, leaf_size):
+    rng = np.random.default_rng(n)
+    points = rng.random((n, d))
+    tree = KDTree(points, leaf_size=leaf_size)
+
+    for point in rng.random((20, d)):
+        for k in (1, 5, n, n + 3):
+            np.testing.assert_allclose(tree.query(point, k), brute_force(points, point, k))
+
+
+def test_query_duplicate_points():
+    points = np.ones((100, 4))
+    tree = KDTree(points, leaf_size=2)
+
+    np.testing.assert_allclose(tree.query(np.ones(4), 10), np.zeros(10))
+    np.testing.assert_allclose(tree.query(np.zeros(4), 3), np.full(3, 2.0))
+
+
+def test_query_empty_tree():
+    assert len(KDTree(np.zeros((0, 0))).query(np.zeros(3), 5)) == 0
+
+
+def test_novelty_empty_generation():
+    assert len(NoveltyArchive().novelty([])) == 0
+
+
+def test_novelty_single_behaviour_with_empty_archive():
+    np.testing.assert_array_equal(NoveltyArchive().novelty([[0.5, 0.5]]), [0.0])
+
+
+def test_novelty_matches_brute_force():
+    rng = np.random.default_rng(0)
+    archive = NoveltyArchive(k=5, threshold=0.0)
+    archived = rng.random((50, 8))
+    archive.add(archived, np.ones(len(archived)))
+    generation = rng.random((30, 8))
+
+    for behaviour, score in zip(generation, archive.novelty(generation)):
+        others = np.concatenate((archived, generation))
+        # Drop the behaviour's zero distance to itself
+        expected = brute_force(others, behaviour, archive.k + 1)[1:].mean()
+        assert score == pytest.approx(expected)
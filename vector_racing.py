@@ -6,7 +6,10 @@ This module implements a simple car driving game in Python using the Pygame engi
 """
 
 import math
+import struct
 import time
+import zlib
+from collections import Counter
 
 import pygame
 import numpy as np
@@ -17,7 +20,16 @@ from recorder import PygameRecord
 # Game Configuration
 SCREEN_SIZE = (800, 800)
 GRID_SIZE = 6
-BOX_SIZE = SCREEN_SIZE[0] / GRID_SIZE
+# Course geometry, car sizes, speeds and ray lengths are in world units, independent of SCREEN_SIZE and GRID_SIZE.
+# One world unit was one pixel when the game drew a 6x6 course to fill the 800 pixel screen.
+WORLD_VIEW_SIZE = 800
+DEFAULT_VIEW_CELLS = 6
+# World units across one course cell
+BOX_SIZE = WORLD_VIEW_SIZE / DEFAULT_VIEW_CELLS
+# World units the camera shows across the screen, DEFAULT_VIEW_CELLS course cells
+CAMERA_VIEW_SIZE = DEFAULT_VIEW_CELLS * BOX_SIZE
+AI_SPEED = 4
+RAY_LENGTH = 500
 SCREEN_DISPLAY_CAPTION = 'Vector Racing'
 SPLASH_SCREEN_TIME = 5
 SPLASH_SCREEN_IMAGE_FILENAME = 'Shrek.png'
@@ -30,8 +42,13 @@ MESSAGE_FONT = 'freesansbold.ttf'
 MESSAGE_FONT_SIZE = 25
 MESSAGE_GAME_OVER = 'You Crashed! Your score was: '
 CLOCK_FPS = 60
+# Ticks a car may go without reaching the next checkpoint, counted in ticks so episodes don't depend on wall-clock time
+CHECKPOINT_TIMEOUT_TICKS = 5 * CLOCK_FPS
+# Laps of the course after which an episode ends, so the score cap scales with the course
+SCORE_LAPS = 3
 DELTA_X_LEFT_CONSTANT = -5
 DELTA_X_RIGHT_CONSTANT = 5
+BEHAVIOUR_BINS = 8
 
 # Colors
 BLACK = (0, 0, 0)
@@ -43,7 +60,7 @@ GREEN = (0, 255, 0)
 
 class Car:
 
-    def __init__(self, pos_x=int(SCREEN_SIZE[0] / 2), pos_y=int(BOX_SIZE * 0.5), delta_x=0,
+    def __init__(self, pos_x=int(GRID_SIZE / 2) * BOX_SIZE, pos_y=int(BOX_SIZE * 0.5), delta_x=0,
                  delta_y=0, theta=90, delta_theta=0, brain=None):
         """Initialise a car object.
 
@@ -69,6 +86,8 @@ class Car:
         self.aa_bounding_box = None
         self.rays = np.zeros(5)
         self.current_box = 0
+        self.progress_ticks = Counter()
+        self.trajectory_checksum = 0
         self.brain = brain
 
     def load_transform_image(self):
@@ -80,11 +99,25 @@ class Car:
         self.image = pygame.transform.scale(
             self.image, HUMAN_PLAYER_IMAGE_SIZE)
 
+    def update_bounding_box(self):
+        """Fit the world space bounding box around the rotated car, as pygame.transform.rotate would size it."""
+        width, height = HUMAN_PLAYER_IMAGE_SIZE
+        if self.theta % 90 == 0:
+            size = (height, width) if self.theta % 180 else (width, height)
+        else:
+            sin, cos = math.sin(math.radians(self.theta)), math.cos(math.radians(self.theta))
+            size = (int(max(abs(cos * width + sin * height), abs(cos * width - sin * height))),
+                    int(max(abs(sin * width + cos * height), abs(sin * width - cos * height))))
+        car_rect = pygame.Rect(0, 0, width, height)
+        car_rect.topleft = (self.pos_x, self.pos_y)
+        self.bounding_box = pygame.Rect((0, 0), size)
+        self.bounding_box.center = car_rect.center
+
     def render_image(self):
         """Render the car image on the display."""
-        rotated_image = pygame.transform.rotate(self.image, self.theta)
-        self.bounding_box = rotated_image.get_rect(center=self.image.get_rect(topleft=[self.pos_x, self.pos_y]).center)
-        screen.blit(rotated_image, self.bounding_box)
+        scaled_image = pygame.transform.scale(self.image, camera.to_screen_size(HUMAN_PLAYER_IMAGE_SIZE))
+        rotated_image = pygame.transform.rotate(scaled_image, self.theta)
+        screen.blit(rotated_image, rotated_image.get_rect(center=camera.to_screen(*self.bounding_box.center)))
 
     def turn_left_right(self):
         """Move the car on the x-plane by delta x."""
@@ -93,12 +126,17 @@ class Car:
     def move_up_down(self):
         """Move the car on the y-plane by delta y."""
         if self.brain:
-            self.pos_x += -4 * math.sin(self.theta / 180 * math.pi)
-            self.pos_y += -4 * math.cos(self.theta / 180 * math.pi)
+            self.pos_x += -AI_SPEED * math.sin(self.theta / 180 * math.pi)
+            self.pos_y += -AI_SPEED * math.cos(self.theta / 180 * math.pi)
         else:
             self.pos_x += self.delta_y * math.sin(self.theta / 180 * math.pi)
             self.pos_y += self.delta_y * math.cos(self.theta / 180 * math.pi)
 
+    def update_trajectory_checksum(self):
+        """Fold the car's exact position and heading into a running checksum of its trajectory."""
+        state = struct.pack('<ddd', self.pos_x, self.pos_y, self.theta)
+        self.trajectory_checksum = zlib.crc32(state, self.trajectory_checksum)
+
     def check_score_accumulated(self, course):
         score = 0
 
@@ -110,6 +148,25 @@ class Car:
             score += 1
         return score
 
+    def record_progress(self, course):
+        """Count a tick spent on the car's current piece of the course path."""
+        self.progress_ticks[self.current_box % len(course.path)] += 1
+
+    def behaviour(self, course, bins=BEHAVIOUR_BINS):
+        """Return a behaviour characterisation of the car's episode.
+
+        The first two values are the final position as a fraction of the course size, the rest are a histogram
+        of the ticks spent along the course path, split into equal sections and normalised to sum to one.
+
+        """
+        course_size = course.world_size
+        histogram = np.zeros(bins)
+        for box, ticks in self.progress_ticks.items():
+            histogram[box * bins // len(course.path)] += ticks
+        if histogram.sum():
+            histogram /= histogram.sum()
+        return np.concatenate(([self.pos_x / course_size, self.pos_y / course_size], histogram))
+
     def shoot_rays(self, course):
         """
         shoot rays out and measure there distance to nearest wall intersection
@@ -117,7 +174,7 @@ class Car:
 
         x, y = self.bounding_box.center
 
-        ray_len = 500
+        ray_len = RAY_LENGTH
 
         targets = [(x - ray_len * math.sin(math.radians(self.theta - 90)), y - ray_len * math.cos(math.radians(self.theta - 90))),
                 (x - ray_len * math.sin(math.radians(self.theta - 45)), y - ray_len * math.cos(math.radians(self.theta - 45))),
@@ -129,7 +186,7 @@ class Car:
             ray = ray_len
             # pygame.draw.line(screen, RED, (x, y), target)
             point = None
-            for line in course.lines:
+            for line in course.lines_near(x, y, *target):
                 if p := get_intersection((x, y), target, *line):
                     dist = ((x - p[0])**2 + (y - p[1])**2)**0.5
                     if dist < ray:
@@ -137,8 +194,8 @@ class Car:
                         point = p
             if point:
                 self.rays[i] = ray
-                pygame.draw.circle(screen, RED, (point[0], point[1]), 10, 2)
-                pygame.draw.line(screen, RED, (x, y), (point[0], point[1]))
+                pygame.draw.circle(screen, RED, camera.to_screen(*point), 10, 2)
+                pygame.draw.line(screen, RED, camera.to_screen(x, y), camera.to_screen(*point))
             else:
                 #This should never happen, need to fix bug in get_intersection
                 self.rays[i] = 0
@@ -199,16 +256,39 @@ def get_intersection(p1, p2, p3, p4):
 
 
 class Course:
-    def __init__(self):
-        """Initialize the courser"""
+    # Look up walls by grid cell, when disabled every wall is checked as the reference behaviour
+    spatial_index = True
+
+    def __init__(self, grid_size=GRID_SIZE, seed=None):
+        """Initialize the courser, the same grid size and seed always give the same course"""
 
         self.lines = []
-        self.course_grid, self.path = generate_course(GRID_SIZE)
+        self.seed = seed
+        self.course_grid, self.path = generate_course(grid_size, seed)
         self.path = self.path[::-1] # reverse path
 
+    @property
+    def grid_size(self):
+        return len(self.course_grid)
+
+    @property
+    def world_size(self):
+        return self.grid_size * BOX_SIZE
+
+    def max_score(self):
+        """Return the score at which an episode on this course ends."""
+        return SCORE_LAPS * len(self.path)
+
+    def start_position(self):
+        """Return the (pos_x, pos_y) a car starts from on this course."""
+        return int(self.grid_size / 2) * BOX_SIZE, int(BOX_SIZE * 0.5)
+
     def init_course(self):
-        for i_y in range(GRID_SIZE):
-            for i_x in range(GRID_SIZE):
+        """Build the course walls in world units, indexed by the grid cell they bound."""
+        self.lines = []
+        self.cell_lines = {}
+        for i_y in range(self.grid_size):
+            for i_x in range(self.grid_size):
 
                 x, y = BOX_SIZE * i_x, BOX_SIZE * i_y
 
@@ -219,33 +299,75 @@ class Course:
 
                 match self.course_grid[i_x, i_y]:
                     case 5:
-                        self.lines.append(top)
-                        self.lines.append(bottom)
+                        lines = [top, bottom]
                     case 10:
-                        self.lines.append(right)
-                        self.lines.append(left)
+                        lines = [right, left]
                     case 3:
-                        self.lines.append(top)
-                        self.lines.append(left)
-                        pygame.draw.arc(screen, BLACK, [x - BOX_SIZE, y, BOX_SIZE * 2, BOX_SIZE * 2], 0, math.pi / 2)
+                        lines = [top, left]
                     case 6:
-                        self.lines.append(top)
-                        self.lines.append(right)
-                        pygame.draw.arc(screen, BLACK, [x, y, BOX_SIZE * 2, BOX_SIZE * 2], math.pi / 2, math.pi)
+                        lines = [top, right]
                     case 9:
-                        self.lines.append(bottom)
-                        self.lines.append(left)
-                        pygame.draw.arc(screen, BLACK, [x - BOX_SIZE, y - BOX_SIZE, BOX_SIZE * 2, BOX_SIZE * 2],
-                                        (3 * math.pi) / 2, 2 * math.pi)
+                        lines = [bottom, left]
                     case 12:
-                        self.lines.append(bottom)
-                        self.lines.append(right)
-                        pygame.draw.arc(screen, BLACK, [x, y - BOX_SIZE, BOX_SIZE * 2, BOX_SIZE * 2], math.pi,
-                                        (3 * math.pi) / 2)
+                        lines = [bottom, right]
+                    case _:
+                        continue
+
+                self.lines.extend(lines)
+                self.cell_lines[i_x, i_y] = lines
+
+    def cells_between(self, x1, y1, x2, y2, margin=2):
+        """Yield the grid cells overlapping the world space box spanned by two corners, grown by margin."""
+        low_x, high_x = min(x1, x2) - margin, max(x1, x2) + margin
+        low_y, high_y = min(y1, y2) - margin, max(y1, y2) + margin
+        for i_x in range(max(int(low_x // BOX_SIZE), 0), min(int(high_x // BOX_SIZE), self.grid_size - 1) + 1):
+            for i_y in range(max(int(low_y // BOX_SIZE), 0), min(int(high_y // BOX_SIZE), self.grid_size - 1) + 1):
+                yield i_x, i_y
+
+    def lines_near(self, x1, y1, x2, y2):
+        """Return the walls that could touch the world space box spanned by two corners."""
+        if not self.spatial_index:
+            return self.lines
+        return [line for cell in self.cells_between(x1, y1, x2, y2) for line in self.cell_lines.get(cell, ())]
 
     def render_course(self):
-        for line in self.lines:
-            pygame.draw.line(screen, BLACK, *line)
+        """Render the walls inside the camera's view."""
+        for cell in self.cells_between(*camera.view_box()):
+            for line in self.cell_lines.get(cell, ()):
+                pygame.draw.line(screen, BLACK, *(camera.to_screen(*point) for point in line))
+
+
+class Camera:
+    def __init__(self, view_size=CAMERA_VIEW_SIZE):
+        """Initialise a camera over the world.
+
+        Args:
+            view_size (float): The width of world shown across the screen, if the course is larger.
+
+        """
+
+        self.view_size = view_size
+        self.view = view_size
+        self.scale = SCREEN_SIZE[0] / view_size
+        self.x = 0
+        self.y = 0
+
+    def follow(self, car, course):
+        """Centre the view on the car, without showing anything beyond the course."""
+        self.view = min(self.view_size, course.world_size)
+        self.scale = SCREEN_SIZE[0] / self.view
+        self.x = min(max(car.pos_x - self.view / 2, 0), course.world_size - self.view)
+        self.y = min(max(car.pos_y - self.view / 2, 0), course.world_size - self.view)
+
+    def view_box(self):
+        """Return the corners (x1, y1, x2, y2) of the world shown on screen."""
+        return self.x, self.y, self.x + self.view, self.y + self.view
+
+    def to_screen(self, x, y):
+        return (x - self.x) * self.scale, (y - self.y) * self.scale
+
+    def to_screen_size(self, size):
+        return round(size[0] * self.scale), round(size[1] * self.scale)
 
 
 def initialize_screen():
@@ -265,7 +387,7 @@ def create_human_player():
 
     # Create the human player car object
     human_player_car = Car(
-        pos_x=int(SCREEN_SIZE[0] / 2),
+        pos_x=int(GRID_SIZE / 2) * BOX_SIZE,
         pos_y=int(BOX_SIZE * 0.5),
         delta_x=0,
         delta_y=0)
@@ -277,8 +399,9 @@ def collision_with_course(car, course):
     """Check whether the human car object has exceeded the screen boundaries
     along the x-plane."""
 
-    for line in course.lines:
-        if car.bounding_box.clipline(line):
+    box = car.bounding_box
+    for line in course.lines_near(box.left, box.top, box.right, box.bottom):
+        if box.clipline(line):
             return True
     return False
 
@@ -306,13 +429,17 @@ def game_over(score):
     speed_increment = 2
 
 
-def indefinite_game_loop(car=create_human_player(), course=Course(), recorder=None):
-    """Vector racing game events and subsequent display rendering actions."""
+def indefinite_game_loop(car=create_human_player(), course=Course(), recorder=None, return_behaviour=False):
+    """Vector racing game events and subsequent display rendering actions.
+
+    Returns the score, or a (score, behaviour) tuple when return_behaviour is set, see Car.behaviour.
+
+    """
 
     car.load_transform_image()
     course.init_course()
     score = 0
-    start = time.time()
+    ticks_since_checkpoint = 0
 
     # ----- FORMULAPY GAME LOOP -----
     while not request_window_close:
@@ -363,13 +490,18 @@ def indefinite_game_loop(car=create_human_player(), course=Course(), recorder=No
         #check score
         if car.check_score_accumulated(course):
             score += 1
-            start = time.time()
+            ticks_since_checkpoint = 0
+        car.record_progress(course)
 
         # Whilst there is no collision event
         global collision_event_detected
 
-        if not collision_event_detected and (time.time() - start) < 5 and score < 100:
+        if not collision_event_detected and ticks_since_checkpoint < CHECKPOINT_TIMEOUT_TICKS and score < course.max_score():
+            ticks_since_checkpoint += 1
 
+            # Only the part of the course around the car is drawn
+            car.update_bounding_box()
+            camera.follow(car, course)
             course.render_course()
 
             # Render the player car object
@@ -402,6 +534,7 @@ def indefinite_game_loop(car=create_human_player(), course=Course(), recorder=No
             # See event detection loop - keyboard key down events
             car.turn_left_right()
             car.move_up_down()
+            car.update_trajectory_checksum()
 
 
             # Check for a collision event with the boundaries of the course
@@ -414,6 +547,8 @@ def indefinite_game_loop(car=create_human_player(), course=Course(), recorder=No
             if recorder:
                 recorder.save()
             game_over(score)
+            if return_behaviour:
+                return score, car.behaviour(course)
             return score
 
         # Update the contents of the entire display
@@ -434,6 +569,9 @@ request_window_close = False
 # Initialise a clock to track time
 clock = pygame.time.Clock()
 
+# Follow the car around the course
+camera = Camera()
+
 # Maintain the game loop until a collision event
 collision_event_detected = False
 
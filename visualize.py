@@ -1,24 +1,85 @@
 from __future__ import print_function
 
 import copy
+import hashlib
+import multiprocessing
+import os
+import threading
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 
 import graphviz
 import matplotlib.pyplot as plt
 import numpy as np
-
-
-def plot_stats(statistics, ylog=False, view=False, filename='avg_fitness.svg'):
-    """ Plots the population's average and best fitness. """
-    if plt is None:
-        warnings.warn("This display is not available due to a missing optional dependency (matplotlib)")
-        return
-
-    generation = range(len(statistics.most_fit_genomes))
-    best_fitness = [c.fitness for c in statistics.most_fit_genomes]
-    avg_fitness = np.array(statistics.get_fitness_mean())
-    stdev_fitness = np.array(statistics.get_fitness_stdev())
-
+from neat.reporting import BaseReporter
+
+STATS_COLUMNS = ('best_fitness', 'avg_fitness', 'stdev_fitness', 'species')
+
+_plot_executor = None
+_plot_future = None
+# Plots requested while another was running, latest arguments per output file
+_plot_requests = {}
+_plot_lock = threading.RLock()
+_drawn_structures = {}
+
+
+class StatsStore(object):
+    """ Append-only on-disk store of per-generation metrics, one float64 column file per metric. """
+
+    def __init__(self, directory='stats', clear=False):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        if clear:
+            for column in STATS_COLUMNS:
+                if os.path.exists(self.column_path(column)):
+                    os.remove(self.column_path(column))
+
+    def column_path(self, column):
+        return os.path.join(self.directory, column + '.f8')
+
+    def append(self, **metrics):
+        """ Appends one generation, only the new values are written. """
+        for column in STATS_COLUMNS:
+            with open(self.column_path(column), 'ab') as f:
+                f.write(np.float64(metrics[column]).tobytes())
+
+    def read(self):
+        """ Returns every column as an array, trimmed to the generations present in all of them. """
+        columns = {}
+        for column in STATS_COLUMNS:
+            path = self.column_path(column)
+            columns[column] = np.fromfile(path, dtype=np.float64) if os.path.exists(path) else np.zeros(0)
+        length = min(len(values) for values in columns.values())
+        return {column: values[:length] for column, values in columns.items()}
+
+
+class StatsStoreReporter(BaseReporter):
+    """ Records each generation into a StatsStore, replots it in the background and redraws changed champions. """
+
+    def __init__(self, store, plot_filename='avg_fitness.svg', net_filename=None, ylog=False):
+        self.store = store
+        self.plot_filename = plot_filename
+        self.net_filename = net_filename
+        self.ylog = ylog
+
+    def post_evaluate(self, config, population, species, best_genome):
+        fitnesses = np.array([g.fitness for g in population.values()], dtype=np.float64)
+        self.store.append(best_fitness=best_genome.fitness,
+                          avg_fitness=fitnesses.mean(),
+                          stdev_fitness=fitnesses.std(),
+                          species=len(species.species))
+
+        if self.plot_filename is not None:
+            plot_stats_async(self.store.directory, ylog=self.ylog, filename=self.plot_filename)
+        if self.net_filename is not None:
+            draw_net_if_changed(config, best_genome, filename=self.net_filename)
+
+    def close(self):
+        """ Waits for the plot of the final generation to be written. """
+        wait_for_plots()
+
+
+def _plot_fitness(generation, best_fitness, avg_fitness, stdev_fitness, ylog, view, filename):
     plt.plot(generation, avg_fitness, 'b-', label="average")
     plt.plot(generation, avg_fitness - stdev_fitness, 'g-.', label="-1 sd")
     plt.plot(generation, avg_fitness + stdev_fitness, 'g-.', label="+1 sd")
@@ -39,6 +100,71 @@ def plot_stats(statistics, ylog=False, view=False, filename='avg_fitness.svg'):
     plt.close()
 
 
+def plot_stats(statistics, ylog=False, view=False, filename='avg_fitness.svg'):
+    """ Plots the population's average and best fitness. """
+    if plt is None:
+        warnings.warn("This display is not available due to a missing optional dependency (matplotlib)")
+        return
+
+    generation = range(len(statistics.most_fit_genomes))
+    best_fitness = [c.fitness for c in statistics.most_fit_genomes]
+    avg_fitness = np.array(statistics.get_fitness_mean())
+    stdev_fitness = np.array(statistics.get_fitness_stdev())
+
+    _plot_fitness(generation, best_fitness, avg_fitness, stdev_fitness, ylog, view, filename)
+
+
+def plot_stats_file(directory, ylog=False, view=False, filename='avg_fitness.svg'):
+    """ Plots the population's average and best fitness from a StatsStore directory. """
+    if plt is None:
+        warnings.warn("This display is not available due to a missing optional dependency (matplotlib)")
+        return
+
+    columns = StatsStore(directory).read()
+    generation = range(len(columns['best_fitness']))
+
+    _plot_fitness(generation, columns['best_fitness'], columns['avg_fitness'], columns['stdev_fitness'],
+                  ylog, view, filename)
+
+
+def plot_stats_async(directory, ylog=False, filename='avg_fitness.svg'):
+    """ Plots a StatsStore in a background process.
+
+    Requests made while a plot is running are coalesced into one more plot, started once the running one finishes,
+    so the last request is always plotted.
+    """
+    with _plot_lock:
+        _plot_requests[filename] = (directory, ylog, False, filename)
+        if _plot_future is None or _plot_future.done():
+            _submit_plot()
+
+
+def _submit_plot():
+    global _plot_executor, _plot_future
+
+    with _plot_lock:
+        if not _plot_requests:
+            return
+
+        if _plot_executor is None:
+            # Forking a process with an open pygame display can hang
+            _plot_executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+
+        _, args = _plot_requests.popitem()
+        _plot_future = _plot_executor.submit(plot_stats_file, *args)
+        _plot_future.add_done_callback(lambda future: _submit_plot())
+
+
+def wait_for_plots():
+    """ Blocks until every requested plot has been written. """
+    while True:
+        with _plot_lock:
+            future = _plot_future
+            if future is None or (future.done() and not _plot_requests):
+                break
+        future.result()
+
+
 def plot_spikes(spikes, view=False, filename=None, title=None):
     """ Plots the trains for a single spiking neuron. """
     t_values = [t for t, I, v, u, f in spikes]
@@ -198,3 +324,20 @@ def draw_net(config, genome, view=False, filename=None, node_names=None, show_di
     dot.render(filename, view=view)
 
     return dot
+
+
+def genome_structure_hash(genome, show_disabled=True):
+    """ Returns a hash of the genome's nodes and connections, ignoring weights and biases. """
+    connections = sorted((cg.key, cg.enabled) for cg in genome.connections.values() if cg.enabled or show_disabled)
+    structure = repr((sorted(genome.nodes.keys()), connections))
+    return hashlib.sha1(structure.encode()).hexdigest()
+
+
+def draw_net_if_changed(config, genome, filename, show_disabled=True, **kwargs):
+    """ Draws the genome only if its structure differs from the last genome drawn to this filename. """
+    structure = genome_structure_hash(genome, show_disabled)
+    if _drawn_structures.get(filename) == structure:
+        return None
+
+    _drawn_structures[filename] = structure
+    return draw_net(config, genome, filename=filename, show_disabled=show_disabled, **kwargs)